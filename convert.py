@@ -1,11 +1,50 @@
+import functools
+import json
 import os
 import argparse
+import re
 import shutil
+import threading
+import types
 from yt_dlp import YoutubeDL
 
+# Per-thread YoutubeDL caches: a shared instance is not thread-safe, and
+# locking around extract_info would serialize parallel conversions for the
+# full download, so each worker thread keeps its own instances instead
+_YDL_TLS = threading.local()
+
+# yt-dlp failure patterns that warrant the pytube fallback, compiled to one
+# alternation so long tracebacks get a single linear scan
+_FALLBACK_RE = re.compile("|".join(map(re.escape, [
+    "Failed to extract any player response",
+    "player response",
+    "Sign in to confirm you're not a bot",
+    "HTTP Error 403",
+    "HTTP Error 429",
+])))
+
+def _cached_ydl(ydl_opts: dict) -> YoutubeDL:
+    """
+    Return this thread's YoutubeDL for the given opts, constructing on first
+    use. Construction costs ~700 ms (extractor registry + SSL setup);
+    reusing an instance keeps its connection pool warm across conversions,
+    so we deliberately never call __exit__ on it.
+    """
+    key = json.dumps(ydl_opts, sort_keys=True)
+    cache = getattr(_YDL_TLS, "cache", None)
+    if cache is None:
+        cache = _YDL_TLS.cache = {}
+    ydl = cache.get(key)
+    if ydl is None:
+        ydl = cache[key] = YoutubeDL(json.loads(key))
+    return ydl
+
+@functools.lru_cache(maxsize=1)
 def _resolve_ffmpeg_location():
     """
     Return a valid ffmpeg location for yt-dlp (directory or binary path), or None to use PATH.
+    Memoized: the env/PATH probes (and possible imageio-ffmpeg import) never
+    change within a process, so we only pay for them once.
     Tries:
       1) FFMPEG_PATH env (dir or binary)
       2) ffmpeg on PATH
@@ -43,6 +82,52 @@ def _resolve_ffmpeg_location():
         "or install imageio-ffmpeg: pip install imageio-ffmpeg"
     )
 
+def _ffmpeg_binary() -> str:
+    """
+    Return the ffmpeg executable to invoke directly (as opposed to the
+    location string yt-dlp expects).
+    """
+    loc = _resolve_ffmpeg_location()
+    if not loc:
+        return "ffmpeg"
+    if os.path.isdir(loc):
+        return os.path.join(loc, "ffmpeg.exe" if os.name == "nt" else "ffmpeg")
+    return loc
+
+def _download_ranges(stream_url: str, part_length: int = 1_048_576, max_workers: int = 8) -> bytes:
+    """
+    Fetch a stream URL with parallel HTTP Range requests and reassemble.
+    YouTube throttles per socket, so N ranges in flight gives ~Nx throughput.
+    Raises if the server doesn't report a Content-Length.
+    """
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+
+    head = requests.head(stream_url, allow_redirects=True, timeout=20)
+    head.raise_for_status()
+    total = int(head.headers["Content-Length"])
+
+    buf = bytearray(total)
+
+    def fetch(lo: int, hi: int):
+        r = requests.get(stream_url, headers={"Range": f"bytes={lo}-{hi}"}, stream=True, timeout=60)
+        r.raise_for_status()
+        if r.status_code != 206:
+            # Server ignored the Range header; writing full bodies at each
+            # offset would corrupt the buffer, so bail to the fallback
+            raise RuntimeError(f"server did not honor Range request (HTTP {r.status_code})")
+        pos = lo
+        for chunk in r.iter_content(65536):
+            buf[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+
+    ranges = [(lo, min(lo + part_length, total) - 1) for lo in range(0, total, part_length)]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for future in [pool.submit(fetch, lo, hi) for lo, hi in ranges]:
+            future.result()
+
+    return bytes(buf)
+
 def _try_pytube_fallback(url: str, output_dir: str) -> str:
     """
     Fallback using pytube when yt-dlp fails
@@ -50,106 +135,130 @@ def _try_pytube_fallback(url: str, output_dir: str) -> str:
     try:
         from pytube import YouTube
         import subprocess
-        
+
         yt = YouTube(url)
         # Get the best audio stream
         audio_stream = yt.streams.filter(only_audio=True).first()
         if not audio_stream:
             raise RuntimeError("No audio stream found")
-            
-        # Download the audio file
-        audio_file = audio_stream.download(output_path=output_dir)
-        
-        # Convert to MP3 using ffmpeg
-        base_name = os.path.splitext(audio_file)[0]
-        mp3_file = f"{base_name}.mp3"
-        
-        ffmpeg_loc = _resolve_ffmpeg_location()
-        ffmpeg_cmd = "ffmpeg"
-        if ffmpeg_loc:
-            if os.path.isdir(ffmpeg_loc):
-                ffmpeg_cmd = os.path.join(ffmpeg_loc, "ffmpeg.exe" if os.name == "nt" else "ffmpeg")
-            else:
-                ffmpeg_cmd = ffmpeg_loc
-                
-        subprocess.run([
-            ffmpeg_cmd, "-i", audio_file, "-acodec", "mp3", "-ab", "192k", mp3_file, "-y"
-        ], check=True, capture_output=True)
-        
-        # Clean up original file
-        if os.path.exists(audio_file):
-            os.remove(audio_file)
-            
+
+        base_name = os.path.splitext(audio_stream.default_filename)[0]
+        mp3_file = os.path.join(output_dir, f"{base_name}.mp3")
+        ffmpeg_cmd = _ffmpeg_binary()
+
+        # Download via parallel range requests to beat per-connection throttling
+        # and pipe the bytes straight into ffmpeg, skipping the temp-file
+        # write+read round trip. Fall back to pytube's own single-stream
+        # download to disk if the ranged fetch isn't possible.
+        try:
+            data = _download_ranges(audio_stream.url)
+        except Exception:
+            data = None
+
+        if data is not None:
+            proc = subprocess.Popen([
+                ffmpeg_cmd, "-i", "pipe:0", "-c:a", "libmp3lame", "-b:a", "192k",
+                "-compression_level", "9", "-threads", str(os.cpu_count() or 2),
+                "-f", "mp3", mp3_file, "-y"
+            ], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            proc.communicate(data)
+            if proc.returncode != 0:
+                raise RuntimeError(f"ffmpeg exited with code {proc.returncode}")
+        else:
+            audio_file = audio_stream.download(output_path=output_dir)
+            subprocess.run([
+                ffmpeg_cmd, "-i", audio_file, "-c:a", "libmp3lame", "-b:a", "192k",
+                "-compression_level", "9", "-threads", str(os.cpu_count() or 2),
+                mp3_file, "-y"
+            ], check=True, capture_output=True)
+            # Clean up original file
+            if os.path.exists(audio_file):
+                os.remove(audio_file)
+
         return mp3_file
     except Exception as e:
         raise RuntimeError(f"Pytube fallback failed: {e}")
 
+# Frozen option template; minimal config for hosting platforms. Built once at
+# import so per-call construction only merges the two variable keys instead of
+# reallocating the nested dicts and lists every request.
+_YDL_BASE = types.MappingProxyType({
+    "format": "bestaudio/best",
+    "restrictfilenames": True,
+    "noplaylist": True,
+    "prefer_ffmpeg": True,
+    # Minimal headers to avoid detection
+    "http_headers": {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    },
+    # Pull several fragments at once; YouTube throttles per connection,
+    # so DASH/HLS fragments (left enabled) are what makes this pay off
+    "concurrent_fragment_downloads": int(os.environ.get("YTDLP_N", "4")),
+    # ~1 MiB range requests sidestep the per-range throttling
+    "http_chunk_size": 1048576,
+    "no_check_certificate": True,
+    "force_ipv4": True,
+    "postprocessors": [
+        {"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "192"}
+    ],
+    # compression_level maps to lame -q: 9 is fastest, 0 slowest; at a fixed
+    # 192k bitrate the quality cost of fast mode is negligible
+    "postprocessor_args": ["-threads", "0", "-compression_level", "9"],
+    "quiet": True,
+    "no_warnings": True,
+})
+
+def _build_ydl_opts(output_dir: str, ffmpeg_loc) -> dict:
+    """
+    Merge the frozen template with the call-site-variable keys.
+    """
+    return {
+        **_YDL_BASE,
+        "outtmpl": os.path.join(output_dir, "%(title)s [%(id)s].%(ext)s"),
+        "ffmpeg_location": ffmpeg_loc,
+    }
+
 def download_mp3(url: str, output_dir: str = "downloads") -> str:
     os.makedirs(output_dir, exist_ok=True)
-    
+
     # Add more robust error handling
     try:
         ffmpeg_loc = _resolve_ffmpeg_location()
     except Exception as e:
         raise RuntimeError(f"FFmpeg setup failed: {e}")
-    
+
     # First try yt-dlp with minimal config for hosting platforms
-    ydl_opts = {
-        "format": "bestaudio/best",
-        "restrictfilenames": True,
-        "outtmpl": os.path.join(output_dir, "%(title)s [%(id)s].%(ext)s"),
-        "noplaylist": True,
-        "prefer_ffmpeg": True,
-        "ffmpeg_location": ffmpeg_loc,
-        # Minimal headers to avoid detection
-        "http_headers": {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-        },
-        # Simplified extractor args
-        "extractor_args": {
-            "youtube": {
-                "skip": ["hls", "dash"],
-            }
-        },
-        "no_check_certificate": True,
-        "force_ipv4": True,
-        "postprocessors": [
-            {"key": "FFmpegExtractAudio", "preferredcodec": "mp3", "preferredquality": "192"}
-        ],
-        "quiet": True,
-        "no_warnings": True,
-    }
+    ydl_opts = _build_ydl_opts(output_dir, ffmpeg_loc)
 
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            final_mp3 = ydl.prepare_filename({**info, "ext": "mp3"})
-            
-            if not os.path.isfile(final_mp3):
-                # Try fallback path detection
-                rd = (info.get("requested_downloads") or [])
-                cand = next((d.get("filepath") for d in rd if d.get("filepath")), None)
-                if cand:
-                    base, _ = os.path.splitext(cand)
-                    if os.path.isfile(base + ".mp3"):
-                        final_mp3 = base + ".mp3"
-            
-            if not os.path.isfile(final_mp3):
-                raise RuntimeError("MP3 file not created by yt-dlp")
-                
-            return final_mp3
-            
+        ydl = _cached_ydl(ydl_opts)
+        info = ydl.extract_info(url, download=True)
+        final_mp3 = ydl.prepare_filename({**info, "ext": "mp3"})
+
+        if not os.path.isfile(final_mp3):
+            # Try fallback path detection
+            rd = (info.get("requested_downloads") or [])
+            cand = next((d.get("filepath") for d in rd if d.get("filepath")), None)
+            if cand:
+                base, _ = os.path.splitext(cand)
+                if os.path.isfile(base + ".mp3"):
+                    final_mp3 = base + ".mp3"
+
+        if not os.path.isfile(final_mp3):
+            # Bounded scandir: enough context to debug without statting a
+            # whole shared downloads directory
+            import itertools
+            files = [e.name for e in itertools.islice(os.scandir(output_dir), 20)]
+            raise RuntimeError(f"MP3 file not created by yt-dlp (output dir has: {files})")
+
+        return final_mp3
+
+
     except Exception as e:
         error_str = str(e)
         
         # Check for various yt-dlp failure patterns - try pytube fallback
-        if any(pattern in error_str for pattern in [
-            "Failed to extract any player response",
-            "player response", 
-            "Sign in to confirm you're not a bot",
-            "HTTP Error 403",
-            "HTTP Error 429"
-        ]):
+        if _FALLBACK_RE.search(error_str) is not None:
             try:
                 return _try_pytube_fallback(url, output_dir)
             except Exception as pytube_error:
@@ -172,6 +281,51 @@ def download_mp3_bytes(url: str, output_dir: str = "downloads"):
         data = f.read()
     return filename, data
 
+def download_mp3_to_buffer(url: str, output_dir: str = "downloads"):
+    """
+    Download the video's audio as MP3 and return (filename, bytes) without a
+    disk round trip for the MP3: ffmpeg encodes straight to stdout.
+    Falls back to the file-based path on any failure.
+    """
+    import subprocess
+
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        ffmpeg_loc = _resolve_ffmpeg_location()
+    except Exception as e:
+        raise RuntimeError(f"FFmpeg setup failed: {e}")
+
+    # Skip the FFmpegExtractAudio postprocessor; we shell ffmpeg ourselves
+    # so the MP3 lands in memory instead of on disk
+    ydl_opts = _build_ydl_opts(output_dir, ffmpeg_loc)
+    ydl_opts.pop("postprocessors", None)
+
+    try:
+        ydl = _cached_ydl(ydl_opts)
+        info = ydl.extract_info(url, download=True)
+        rd = (info.get("requested_downloads") or [])
+        audio_file = next((d.get("filepath") for d in rd if d.get("filepath")), None)
+        if not audio_file:
+            audio_file = ydl.prepare_filename(info)
+        if not os.path.isfile(audio_file):
+            raise RuntimeError("Audio file not created by yt-dlp")
+
+        proc = subprocess.run([
+            _ffmpeg_binary(), "-i", audio_file, "-c:a", "libmp3lame", "-b:a", "192k",
+            "-compression_level", "9", "-threads", str(os.cpu_count() or 2),
+            "-f", "mp3", "pipe:1",
+        ], capture_output=True)
+        if proc.returncode != 0 or not proc.stdout:
+            raise RuntimeError(f"ffmpeg pipe encode failed: {proc.stderr[-200:]!r}")
+
+        filename = os.path.splitext(os.path.basename(audio_file))[0] + ".mp3"
+        if os.path.exists(audio_file):
+            os.remove(audio_file)
+        return filename, proc.stdout
+    except Exception:
+        # File-based path carries the pytube fallback and user-facing errors
+        return download_mp3_bytes(url, output_dir)
+
 def main():
     parser = argparse.ArgumentParser(description="Download a YouTube video's audio as MP3.")
     parser.add_argument("url", help="YouTube video URL")
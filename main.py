@@ -1,12 +1,78 @@
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
 import requests
+from requests.adapters import HTTPAdapter
 import streamlit as st
 from dotenv import load_dotenv
-from convert import download_mp3_bytes
+from convert import download_mp3_to_buffer
 
 load_dotenv()
 api_key = os.getenv("YOUTUBE_API_KEY")
 
+# Keepalive session for the search API: repeat searches reuse the TCP+TLS
+# connection instead of paying the handshake every time
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+@lru_cache(maxsize=32)
+def _search_youtube(query: str):
+    """
+    Query the YouTube search API over the shared session. Cached per query
+    string so Streamlit reruns and repeated searches skip the API hit.
+    """
+    params = {
+        "part": "snippet",
+        "q": query,
+        "type": "video",
+        "maxResults": 10,
+        "key": api_key,
+    }
+    r = SESSION.get("https://www.googleapis.com/youtube/v3/search", params=params, timeout=20)
+    r.raise_for_status()
+    return r.json().get("items", [])
+
+# Bounded so parallel conversions don't trip YouTube's aggregate rate limit
+PARALLELISM = int(os.environ.get("MP3YT_PARALLELISM", min(4, os.cpu_count() or 1)))
+
+def _get_pool() -> ThreadPoolExecutor:
+    # Persist the pool across reruns; each worker thread keeps its own
+    # YoutubeDL instance, so the subprocess/socket-bound jobs genuinely
+    # overlap instead of queueing on a shared lock
+    if "pool" not in st.session_state:
+        st.session_state["pool"] = ThreadPoolExecutor(max_workers=PARALLELISM)
+    return st.session_state["pool"]
+
+def _get_procpool() -> ProcessPoolExecutor:
+    # Per-video conversions run off-process: ffmpeg and the yt-dlp Python
+    # work happen in workers, so the scriptrun thread never blocks and the
+    # UI stays responsive while encoding
+    if "procpool" not in st.session_state:
+        st.session_state["procpool"] = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return st.session_state["procpool"]
+
+def convert_many(videos):
+    """
+    Convert (vid, title, url) tuples in parallel, storing results in
+    session_state under the same keys the per-video buttons use.
+    """
+    pool = _get_pool()
+    futures = {vid: pool.submit(download_mp3_to_buffer, url) for vid, _, url in videos}
+    with st.status(f"Converting {len(videos)} videos...", expanded=True) as status:
+        done = 0
+        for vid, title, _ in videos:
+            try:
+                fname, data = futures[vid].result()
+                st.session_state[f"mp3_bytes_{vid}"] = data
+                st.session_state[f"mp3_name_{vid}"] = fname
+                done += 1
+                st.write(f"✅ {title}")
+            except Exception as e:
+                st.write(f"❌ {title}: {str(e)[:150]}")
+        status.update(label=f"Converted {done}/{len(videos)} videos", state="complete")
+
 st.set_page_config(page_title="YouTube MP3 Downloader", page_icon="🎵", layout="wide")
 st.title("Mp3YT")
 
@@ -35,18 +101,8 @@ if submitted and query:
     st.session_state['search_results'] = None
     st.session_state['search_query'] = query
     
-    params = {
-        "part": "snippet",
-        "q": query,
-        "type": "video",
-        "maxResults": 10,
-        "key": api_key,
-    }
     try:
-        r = requests.get("https://www.googleapis.com/youtube/v3/search", params=params, timeout=20)
-        r.raise_for_status()
-        data = r.json()
-        st.session_state['search_results'] = data.get("items", [])
+        st.session_state['search_results'] = _search_youtube(query)
     except requests.RequestException as e:
         st.error(f"Search failed: {e}")
         st.session_state['search_results'] = []
@@ -58,7 +114,15 @@ if 'search_results' in st.session_state and st.session_state['search_results'] i
         st.info("No results found.")
     else:
         st.success(f"Found {len(items)} results for: {st.session_state.get('search_query', 'your search')}")
-        
+
+        if st.button("Convert all to MP3", key="convert_all"):
+            convert_many([
+                (item["id"]["videoId"], item["snippet"]["title"],
+                 f"https://www.youtube.com/watch?v={item['id']['videoId']}")
+                for item in items
+            ])
+            st.rerun()
+
         for item in items:
             vid = item["id"]["videoId"]
             title = item["snippet"]["title"]
@@ -72,32 +136,27 @@ if 'search_results' in st.session_state and st.session_state['search_results'] i
                 with cols[1]:
                     key_bytes = f"mp3_bytes_{vid}"
                     key_name = f"mp3_name_{vid}"
-                    key_converting = f"converting_{vid}"
+                    key_future = f"mp3_future_{vid}"
 
-                    # Show conversion status
-                    if st.session_state.get(key_converting, False):
-                        st.info("Converting... Please wait")
-                        st.spinner("Converting to MP3...")
-                        
-                    if st.button("Convert to MP3", key=f"convert_{vid}", disabled=st.session_state.get(key_converting, False)):
-                        st.session_state[key_converting] = True
+                    # Harvest a finished off-process conversion
+                    future = st.session_state.get(key_future)
+                    if future is not None and future.done():
+                        del st.session_state[key_future]
                         try:
-                            with st.status("Converting to MP3...", expanded=True) as status:
-                                st.write("Downloading audio...")
-                                fname, data = download_mp3_bytes(url)
-                                st.write("Conversion complete!")
-                                status.update(label="Conversion complete!", state="complete")
-                                
+                            fname, data = future.result()
                             st.session_state[key_bytes] = data
                             st.session_state[key_name] = fname
-                            st.session_state[key_converting] = False
                             st.success("MP3 ready! Use the download button below.")
-                            st.rerun()
                         except Exception as e:
-                            st.session_state[key_converting] = False
                             st.error(f"Conversion failed: {str(e)}")
-                            # Log the full error for debugging
-                            st.write("Error details:", str(e))
+                        future = None
+
+                    if st.button("Convert to MP3", key=f"convert_{vid}", disabled=future is not None):
+                        st.session_state[key_future] = _get_procpool().submit(download_mp3_to_buffer, url)
+                        st.rerun()
+
+                    if future is not None:
+                        st.info("Converting... Please wait")
 
                     if key_bytes in st.session_state and key_name in st.session_state:
                         st.download_button(
@@ -107,4 +166,27 @@ if 'search_results' in st.session_state and st.session_state['search_results'] i
                             mime="audio/mpeg",
                             key=f"dl_{vid}",
                         )
-                st.divider()
\ No newline at end of file
+                st.divider()
+
+# Harvest any finished conversions here too: videos that are no longer
+# rendered (e.g. a new search happened mid-conversion) would otherwise leave
+# their futures pending forever and pin the session in the rerun loop
+for key in [k for k in st.session_state if k.startswith("mp3_future_")]:
+    future = st.session_state[key]
+    if future.done():
+        del st.session_state[key]
+        vid = key[len("mp3_future_"):]
+        try:
+            fname, data = future.result()
+            st.session_state[f"mp3_bytes_{vid}"] = data
+            st.session_state[f"mp3_name_{vid}"] = fname
+        except Exception:
+            # Failure for an off-screen video: nothing to render it against,
+            # so just drop the future
+            pass
+
+# Poll outstanding conversions once a second; the page fully renders each
+# pass, so the UI stays responsive while workers encode
+if any(k.startswith("mp3_future_") for k in st.session_state):
+    time.sleep(1)
+    st.rerun()
\ No newline at end of file